@@ -1,10 +1,20 @@
 """
 SHAP-based and heuristic explainability layer.
 Translates model feature importances into plain-English, student-friendly reasons.
+
+For scikit-learn forests, per-feature contributions are computed directly from
+the decision paths (the Saabas method); other tree models go through SHAP.
 """
 
-import shap
+import re
 import numpy as np
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+
+from feature_columns import URL_FEATURE_COLUMNS
+
+# Explainers keyed by id(model). Building one walks the whole forest,
+# so we keep it around until the model is reloaded or retrained.
+_EXPLAINER_CACHE: dict = {}
 
 # ─────────────────────────────────────────────
 #  Plain English explanations keyed by the
@@ -44,6 +54,13 @@ FEATURE_EXPLANATIONS = {
     "StatsReport":          "This URL appears in known phishing/malware blacklists.",
 }
 
+# Explanations by column position, for models trained on the standard
+# 30-column layout
+_FEATURE_COLUMNS = URL_FEATURE_COLUMNS
+_EXPL_BY_IDX = tuple(
+    FEATURE_EXPLANATIONS.get(name, f"Suspicious indicator: {name}") for name in _FEATURE_COLUMNS
+)
+
 # Generic email text keywords
 EMAIL_TEXT_EXPLANATIONS = {
     "urgent":      "The email creates a false sense of urgency (e.g. 'urgent', 'immediately').",
@@ -57,60 +74,207 @@ EMAIL_TEXT_EXPLANATIONS = {
     "immediately": "The email demands immediate action — a pressure tactic.",
 }
 
+# One alternation over all keywords, so the text is scanned in a single pass
+_KEYWORD_RE = re.compile(
+    r"\b(" + "|".join(map(re.escape, EMAIL_TEXT_EXPLANATIONS)) + r")\b", re.IGNORECASE
+)
 
-def get_url_explanation(model, features_df):
-    """Return a list of plain-English reasons a URL was flagged, using SHAP TreeExplainer."""
-    try:
-        explainer = shap.TreeExplainer(model)
-        shap_values = explainer.shap_values(features_df)
+
+def reset_explainer_cache():
+    """Drop cached explainers. Call whenever the URL model is reloaded or retrained."""
+    _EXPLAINER_CACHE.clear()
+
+
+class _ForestContributions:
+    """
+    Per-feature contributions to the phishing probability of a forest classifier.
+    Each split on a sample's decision path moves the node's phishing probability;
+    that delta is credited to the split feature and averaged over all trees.
+    """
+
+    def __init__(self, model):
+        self.n_features = model.n_features_in_
+        # memoryviews onto each tree's own node arrays: indexing them yields
+        # plain Python numbers almost as fast as lists, without copying the
+        # forest into per-node Python objects (or going through NumPy scalars).
+        self.trees = []
+        for est in model.estimators_:
+            tree = est.tree_
+            self.trees.append((
+                memoryview(tree.children_left),
+                memoryview(tree.children_right),
+                memoryview(tree.feature),
+                memoryview(tree.threshold),
+                memoryview(tree.value),
+            ))
+
+    def __call__(self, features_df):
+        X = np.asarray(features_df, dtype=np.float32).tolist()
+        return np.array([self._explain_row(x) for x in X])
+
+    @staticmethod
+    def _phishing_prob(value, node):
+        safe, phishing = value[node, 0, 0], value[node, 0, 1]
+        return phishing / (safe + phishing)
+
+    def _explain_row(self, x):
+        phishing_prob = self._phishing_prob
+        contributions = [0.0] * self.n_features
+        for left, right, feature, threshold, value in self.trees:
+            node = 0
+            prob = phishing_prob(value, 0)
+            while left[node] != -1:
+                feat = feature[node]
+                child = left[node] if x[feat] <= threshold[node] else right[node]
+                child_prob = phishing_prob(value, child)
+                contributions[feat] += child_prob - prob
+                node, prob = child, child_prob
+        n_trees = len(self.trees)
+        return [c / n_trees for c in contributions]
+
+
+class _ShapContributions:
+    """SHAP values for the phishing class, for tree models other than forests."""
+
+    def __init__(self, model):
+        # Imported lazily: shap is slow to import and only needed for
+        # non-forest models, and only once a URL is flagged.
+        import shap
+        self.explainer = shap.TreeExplainer(model)
+
+    def __call__(self, features_df):
+        shap_values = self.explainer.shap_values(features_df)
 
         # Binary classification: shap_values may be a list [class_0, class_1]
+        # or a (rows, features, classes) array, depending on the model and shap version.
         if isinstance(shap_values, list):
-            sv = shap_values[1][0]
+            return shap_values[1]
+        if shap_values.ndim == 3:
+            return shap_values[:, :, 1]
+        return shap_values
+
+
+def _get_explainer(model):
+    explainer = _EXPLAINER_CACHE.get(id(model))
+    if explainer is None:
+        if isinstance(model, (RandomForestClassifier, ExtraTreesClassifier)):
+            explainer = _ForestContributions(model)
         else:
-            sv = shap_values[0]
+            explainer = _ShapContributions(model)
+        explainer = _EXPLAINER_CACHE.setdefault(id(model), explainer)
+    return explainer
 
-        feature_names = features_df.columns
-        contributions = sorted(zip(feature_names, sv), key=lambda x: x[1], reverse=True)
 
-        reasons = []
-        for feat, val in contributions[:5]:
-            if val > 0.01:
-                reasons.append(
-                    FEATURE_EXPLANATIONS.get(feat, f"Suspicious indicator: {feat}")
-                )
+def _explanations_for(feature_names):
+    """Explanation strings aligned with the model's feature columns."""
+    if list(feature_names) == _FEATURE_COLUMNS:
+        return _EXPL_BY_IDX
+    return tuple(FEATURE_EXPLANATIONS.get(name, f"Suspicious indicator: {name}") for name in feature_names)
+
+
+def _url_reasons(explanations, sv):
+    # Top 5 contributions, without sorting all 30
+    k = min(5, sv.size)
+    top = np.argpartition(sv, -k)[-k:]
+    top = top[np.argsort(-sv[top], kind="stable")]
+
+    reasons = [explanations[i] for i in top if sv[i] > 0.01]
 
-        return reasons if reasons else ["The overall URL pattern matches known phishing websites."]
+    return reasons if reasons else ["The overall URL pattern matches known phishing websites."]
+
+
+def get_url_explanations(model, features):
+    """
+    Batch version of get_url_explanation: one list of reasons per row of features.
+    Contributions for all rows are computed in a single explainer call.
+    `features` is a DataFrame, or a single feature dict as returned by
+    URLModel.extract_features_dict.
+    """
+    if isinstance(features, dict):
+        feature_names, X = list(features), np.array([list(features.values())])
+    else:
+        feature_names, X = features.columns, features
+
+    try:
+        explainer = _get_explainer(model)
+        contributions = explainer(X)
+        explanations = _explanations_for(feature_names)
+        return [_url_reasons(explanations, sv) for sv in contributions]
     except Exception as e:
         print(f"SHAP Explainer Error: {e}")
-        return ["The URL matches patterns commonly seen in phishing links."]
+        return [["The URL matches patterns commonly seen in phishing links."] for _ in range(len(X))]
+
+
+def get_url_explanation(model, features):
+    """Return a list of plain-English reasons a URL was flagged, based on per-feature contributions."""
+    return get_url_explanations(model, features)[0]
+
+
+def _present_terms(vectorizer, text):
+    """Map feature index -> token for the terms in text. Counts don't matter here."""
+    tokens = list(dict.fromkeys(vectorizer.build_analyzer()(text)))
+    vocabulary = getattr(vectorizer, "vocabulary_", None)
+    if vocabulary is not None:
+        return {vocabulary[t]: t for t in tokens if t in vocabulary}
+
+    if not tokens:
+        return {}
+    # HashingVectorizer has no vocabulary: hash each token on its own row,
+    # so a row's single column index is that token's feature.
+    hashed = vectorizer.transform(tokens)
+    indptr, indices = hashed.indptr, hashed.indices
+    return {indices[indptr[i]]: t for i, t in enumerate(tokens) if indptr[i] < indptr[i + 1]}
 
 
 def get_text_explanation(vectorizer, model, text):
-    """Explain an email text prediction using TF-IDF feature log-probabilities."""
+    """
+    Explain an email text prediction. Known phishing keywords are reported directly
+    (up to 3, in order of appearance); otherwise fall back to the words the model
+    weighs most towards phishing, using its feature log-probabilities.
+    """
+    keywords = []
+    for match in _KEYWORD_RE.finditer(text):
+        word = match.group(1).lower()
+        if word not in keywords:
+            keywords.append(word)
+            if len(keywords) == 3:
+                break
+    if keywords:
+        return [EMAIL_TEXT_EXPLANATIONS[word] for word in keywords]
+
     try:
-        X = vectorizer.transform([text])
-        feature_names = vectorizer.get_feature_names_out()
-        nonzero_indices = X.nonzero()[1]
+        terms = _present_terms(vectorizer, text)
+        # Column order, so ties below break the same way as a stable sort would
+        nonzero_indices = np.sort(np.fromiter(terms, dtype=np.int64, count=len(terms)))
 
         if hasattr(model, "feature_log_prob_"):
-            phishing_probs = model.feature_log_prob_[1]
-            safe_probs = model.feature_log_prob_[0]
-            diff = phishing_probs - safe_probs
+            # Phishing-vs-safe log-probability of the present terms only; the
+            # full row is as wide as the vectorizer (2**18 with hashing)
+            flp = model.feature_log_prob_
+            diff = flp[1, nonzero_indices] - flp[0, nonzero_indices]
 
-            text_word_diffs = [(feature_names[i], diff[i]) for i in nonzero_indices]
-            text_word_diffs.sort(key=lambda x: x[1], reverse=True)
+            # Top 3 words by that difference, without sorting them all: keep every
+            # term scoring at least the 3rd-highest value (ties included), then
+            # order those stably so equal scores stay in column order
+            k = min(3, diff.size)
+            if k:
+                kth = np.partition(diff, -k)[-k]
+                order = np.flatnonzero(diff >= kth)
+                order = order[np.argsort(-diff[order], kind="stable")][:k]
+            else:
+                order = np.arange(0)
+            top = nonzero_indices[order[diff[order] > 0]]
 
             reasons = []
-            for word, score in text_word_diffs[:3]:
-                if score > 0:
-                    reasons.append(
-                        EMAIL_TEXT_EXPLANATIONS.get(
-                            word,
-                            f"Use of suspicious or manipulative language (e.g. '{word}').",
-                        )
+            for i in top:
+                word = terms[i]
+                reasons.append(
+                    EMAIL_TEXT_EXPLANATIONS.get(
+                        word,
+                        f"Use of suspicious or manipulative language (e.g. '{word}').",
                     )
-            return list(set(reasons)) if reasons else ["The wording and tone match known phishing emails."]
+                )
+            return list(dict.fromkeys(reasons)) if reasons else ["The wording and tone match known phishing emails."]
     except Exception as e:
         print(f"Text Explainer Error: {e}")
 
@@ -0,0 +1,22 @@
+"""
+Column layout of the URL feature set (Kaggle "Phishing Website Detector")
+and of the feedback CSV. Kept free of imports and side effects so any module
+can use it.
+"""
+
+URL_FEATURE_COLUMNS = [
+    "UsingIP", "LongURL", "ShortURL", "Symbol@", "Redirecting//",
+    "PrefixSuffix-", "SubDomains", "HTTPS", "DomainRegLen", "Favicon",
+    "NonStdPort", "HTTPSDomainURL", "RequestURL", "AnchorURL",
+    "LinksInScriptTags", "ServerFormHandler", "InfoEmail", "AbnormalURL",
+    "WebsiteForwarding", "StatusBarCust", "DisableRightClick",
+    "UsingPopupWindow", "IframeRedirection", "AgeofDomain", "DNSRecording",
+    "WebsiteTraffic", "PageRank", "GoogleIndex", "LinksPointingToPage",
+    "StatsReport",
+]
+
+FEEDBACK_COLUMNS = [
+    "url", "user_label", "prediction_was",
+    # All 30 features extracted at prediction time
+    *URL_FEATURE_COLUMNS,
+]
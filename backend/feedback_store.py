@@ -1,17 +1,17 @@
 """
 Feedback storage and auto-retrain logic.
 Stores user corrections to a CSV. When the count reaches RETRAIN_THRESHOLD,
-automatically retrains the URL model on the original data + corrections,
-then clears the feedback file.
+automatically retrains the URL model on the original data + corrections
+in a separate process, then clears the feedback file. The API picks up the
+new model when it notices the model file has changed.
 """
 
 import csv
+import multiprocessing
 import os
 import threading
-import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-import joblib
+
+from feature_columns import FEEDBACK_COLUMNS, URL_FEATURE_COLUMNS
 
 FEEDBACK_FILE = os.path.join(os.path.dirname(__file__), "feedback_log.csv")
 RETRAIN_THRESHOLD = 500
@@ -20,18 +20,16 @@ CSV_PATH = os.path.join(DATA_DIR, "phishing.csv")
 MODEL_PATH = os.path.join(os.path.dirname(__file__), "url_model.pkl")
 FEATURES_PATH = os.path.join(os.path.dirname(__file__), "url_features.pkl")
 
-FEEDBACK_COLUMNS = [
-    "url", "user_label", "prediction_was",
-    # All 30 features extracted at prediction time
-    "UsingIP", "LongURL", "ShortURL", "Symbol@", "Redirecting//",
-    "PrefixSuffix-", "SubDomains", "HTTPS", "DomainRegLen", "Favicon",
-    "NonStdPort", "HTTPSDomainURL", "RequestURL", "AnchorURL",
-    "LinksInScriptTags", "ServerFormHandler", "InfoEmail", "AbnormalURL",
-    "WebsiteForwarding", "StatusBarCust", "DisableRightClick",
-    "UsingPopupWindow", "IframeRedirection", "AgeofDomain", "DNSRecording",
-    "WebsiteTraffic", "PageRank", "GoogleIndex", "LinksPointingToPage",
-    "StatsReport"
-]
+# Cached row count (valid while the file's mtime matches) and a persistent
+# append handle, opened on the first store_feedback. Both are guarded by
+# _feedback_lock: FastAPI may handle feedback concurrently.
+_feedback_count = None
+_feedback_count_mtime = 0
+_feedback_fh = None
+_feedback_writer = None
+_feedback_lock = threading.Lock()
+
+_retrain_process = None
 
 
 def _ensure_file():
@@ -42,49 +40,101 @@ def _ensure_file():
             writer.writerow(FEEDBACK_COLUMNS)
 
 
-def count_feedback():
-    """Return the number of feedback entries currently stored."""
+def _open_feedback_file():
+    """Open the persistent append handle used by store_feedback."""
+    global _feedback_fh, _feedback_writer
     _ensure_file()
+    _feedback_fh = open(FEEDBACK_FILE, "a", newline="", buffering=1)
+    _feedback_writer = csv.writer(_feedback_fh)
+
+
+def close_feedback_store():
+    """Close the append handle. Called on API shutdown."""
+    with _feedback_lock:
+        if _feedback_fh is not None and not _feedback_fh.closed:
+            _feedback_fh.close()
+
+
+def _count_rows():
     with open(FEEDBACK_FILE, "r") as f:
         return max(0, sum(1 for _ in f) - 1)  # subtract header
 
 
+def _cached_count_is_stale():
+    return _feedback_count is None or os.stat(FEEDBACK_FILE).st_mtime_ns != _feedback_count_mtime
+
+
+def count_feedback():
+    """Return the number of feedback entries currently stored."""
+    global _feedback_count, _feedback_count_mtime
+    _ensure_file()
+    with _feedback_lock:
+        if _cached_count_is_stale():
+            _feedback_count_mtime = os.stat(FEEDBACK_FILE).st_mtime_ns
+            _feedback_count = _count_rows()
+        return _feedback_count
+
+
 def store_feedback(url: str, features_dict: dict, user_label: str, prediction_was: str):
     """
     Append one feedback row. Returns the new total count.
-    If count >= RETRAIN_THRESHOLD, triggers retraining in a background thread.
+    If count >= RETRAIN_THRESHOLD, triggers retraining in a background process.
     """
-    _ensure_file()
+    global _feedback_count, _feedback_count_mtime, _retrain_process
+    row = [url, user_label, prediction_was, *(features_dict.get(col, 0) for col in URL_FEATURE_COLUMNS)]
 
-    row = [url, user_label, prediction_was]
-    for col in FEEDBACK_COLUMNS[3:]:  # the 30 feature columns
-        row.append(features_dict.get(col, 0))
+    with _feedback_lock:
+        if _feedback_fh is None or _feedback_fh.closed or not os.path.exists(FEEDBACK_FILE):
+            _open_feedback_file()
+        stale = _cached_count_is_stale()
 
-    with open(FEEDBACK_FILE, "a", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(row)
+        _feedback_writer.writerow(row)
+        _feedback_fh.flush()
 
-    total = count_feedback()
+        _feedback_count_mtime = os.stat(FEEDBACK_FILE).st_mtime_ns
+        _feedback_count = _count_rows() if stale else _feedback_count + 1
+        total = _feedback_count
     print(f"[Feedback] Stored correction #{total}: {user_label} (was {prediction_was})")
 
-    if total >= RETRAIN_THRESHOLD:
+    if total >= RETRAIN_THRESHOLD and not (_retrain_process and _retrain_process.is_alive()):
         print(f"[Feedback] Threshold reached ({total} >= {RETRAIN_THRESHOLD}). Triggering retrain...")
-        thread = threading.Thread(target=retrain_with_feedback, daemon=True)
-        thread.start()
+        # A separate process keeps pandas/sklearn from contending for the GIL
+        # with request handling while the model is being fitted.
+        _retrain_process = multiprocessing.get_context("spawn").Process(
+            target=retrain_with_feedback, daemon=True
+        )
+        _retrain_process.start()
 
     return total
 
 
+def _atomic_dump(obj, path):
+    """joblib.dump via a temp file so readers never see a half-written file."""
+    import joblib
+    tmp_path = path + ".tmp"
+    joblib.dump(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+
 def retrain_with_feedback():
     """
     Merge original Kaggle data with feedback corrections, retrain the model,
     save the new model, and clear the feedback file.
     """
+    # Imported here: retraining is rare and runs in its own process, so the
+    # API doesn't need to pay for these at startup.
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+    from sklearn.ensemble import HistGradientBoostingClassifier
+
     try:
         print("[Retrain] Starting auto-retrain...")
 
-        # Load original data
-        original_df = pd.read_csv(CSV_PATH)
+        # Load original data. float32 features (the values are only -1/0/1)
+        # halve memory and speed up histogram building during the fit.
+        dtype_map = {col: "float32" for col in URL_FEATURE_COLUMNS}
+        dtype_map["class"] = "int8"
+        original_df = pd.read_csv(CSV_PATH, dtype=dtype_map)
         target_col = "class"
         drop_cols = [target_col]
         if "Index" in original_df.columns:
@@ -95,9 +145,8 @@ def retrain_with_feedback():
 
         # Load feedback data
         feedback_df = pd.read_csv(FEEDBACK_FILE)
-        feature_cols = FEEDBACK_COLUMNS[3:]  # The 30 feature columns
 
-        X_feedback = feedback_df[feature_cols].astype(float)
+        X_feedback = feedback_df[URL_FEATURE_COLUMNS].astype("float32")
         # user_label: "phishing" -> 1, "safe" -> 0
         y_feedback = feedback_df["user_label"].map({"phishing": 1, "safe": 0})
 
@@ -114,20 +163,24 @@ def retrain_with_feedback():
         print(f"[Retrain] Combined dataset: {len(X_combined)} samples "
               f"({len(X_orig)} original + {len(X_feedback)} feedback)")
 
-        # Train
+        # Train (on a plain array, like train_url.py: prediction passes arrays
+        # in FEATURES_PATH column order)
         X_train, X_test, y_train, y_test = train_test_split(
-            X_combined, y_combined, test_size=0.2, random_state=42, stratify=y_combined
+            X_combined.to_numpy(), y_combined, test_size=0.2, random_state=42, stratify=y_combined
         )
 
-        clf = RandomForestClassifier(n_estimators=200, random_state=42, n_jobs=-1)
+        # Histogram-based boosting trains several times faster than a 200-tree
+        # forest on this data, with less memory, and spends its time in native
+        # code that releases the GIL, so the API stays responsive meanwhile.
+        clf = HistGradientBoostingClassifier(max_iter=300, learning_rate=0.05, random_state=42)
         clf.fit(X_train, y_train)
 
         acc = clf.score(X_test, y_test)
         print(f"[Retrain] New model accuracy: {acc:.4f}")
 
-        # Save new model
-        joblib.dump(clf, MODEL_PATH)
-        joblib.dump(X_orig.columns.tolist(), FEATURES_PATH)
+        # Save new model (model last: the API reloads when the model file changes)
+        _atomic_dump(X_orig.columns.tolist(), FEATURES_PATH)
+        _atomic_dump(clf, MODEL_PATH)
         print(f"[Retrain] Model saved to {MODEL_PATH}")
 
         # Clear feedback file (reset for next batch)
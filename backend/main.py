@@ -1,10 +1,15 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, List, Dict
 
 import os
 import sys
+import threading
+from functools import lru_cache
+import pandas as pd
 
 # Add current directory to path so imports work
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -13,13 +18,27 @@ from models.url_model import URLModel
 from models.email_model import EmailModel
 from models.headers_check import check_headers_for_anomalies
 from models.file_scanner import scan_file
-from explain.shap_explainer import get_url_explanation, get_text_explanation
+from explain.shap_explainer import get_url_explanation, get_url_explanations, get_text_explanation
+from feedback_store import store_feedback, count_feedback, close_feedback_store, RETRAIN_THRESHOLD
 
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024   # 1 MB
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up the email model so the first real request doesn't pay for page
+    # faults and lazy setup. URLModel.load_model warms URL prediction itself
+    # (which also covers hot reloads). The URL explainer is left to build on the
+    # first flagged URL: for non-forest models it imports shap, which would slow
+    # every boot.
+    email_model_instance.predict("warmup")
+    yield
+    close_feedback_store()
 
 app = FastAPI(
     title="AI Phishing Detector API",
-    description="Early warning system backend for URLs and Emails with explainability."
+    description="Early warning system backend for URLs and Emails with explainability.",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -38,6 +57,9 @@ email_model_instance = EmailModel()
 class URLRequest(BaseModel):
     url: str
 
+class URLBatchRequest(BaseModel):
+    urls: List[str]
+
 class EmailRequest(BaseModel):
     body_text: str
     headers: Optional[Dict[str, str]] = {}
@@ -48,26 +70,120 @@ class FeedbackRequest(BaseModel):
     user_label: str       # 'safe' or 'phishing'
     prediction_was: str   # What the model predicted
 
-@app.post("/predict/url")
-async def predict_url(req: URLRequest):
+# Response schemas: with a response model, FastAPI serializes straight to
+# JSON bytes through Pydantic instead of jsonable_encoder + json.dumps.
+# Endpoints whose payload shape varies use response_model_exclude_unset, so
+# only the keys the handler returned are sent.
+class URLPrediction(BaseModel):
+    risk_score: float
+    prediction: str
+    url: Optional[str] = None
+    explanations: Optional[List[str]] = None
+    error: Optional[str] = None
+
+class URLBatchPrediction(BaseModel):
+    results: List[URLPrediction]
+
+class EmailPrediction(BaseModel):
+    url_or_subject: str
+    risk_score: float
+    prediction: str
+    text_risk: float
+    header_risk: float
+    explanations: List[str]
+
+class FeedbackResponse(BaseModel):
+    status: str
+    message: str
+    feedback_count: Optional[int] = None
+    retrain_threshold: Optional[int] = None
+
+class FeedbackStatus(BaseModel):
+    feedback_count: int
+    retrain_threshold: int
+    progress_percent: float
+
+class FileScanResult(BaseModel):
+    filename: Optional[str]
+    size_bytes: int
+    risk_score: float
+    verdict: str
+    detected_type: str
+    entropy: float
+    reasons: List[str]
+
+# Bumped each time a retrained URL model is loaded; part of the prediction
+# cache key, so a result computed with a replaced model is never served.
+_url_model_generation = 0
+_url_model_lock = threading.Lock()
+
+@lru_cache(maxsize=4096)
+def _cached_predict(url: str, generation: int) -> tuple:
+    """
+    Prediction + explanations for a URL, cached because the extension re-checks
+    pages users revisit. Stored as tuples so cached values can't be mutated.
+    """
     # Base prediction
-    result = url_model_instance.predict(req.url)
-    
+    result = url_model_instance.predict(url)
+
     if "error" in result:
-        return result # E.g., model not loaded
-        
+        return tuple(result.items()) # E.g., model not loaded
+
     # Explainability
     if result["prediction"] == "phishing" and url_model_instance.model:
-        features_df = url_model_instance.extract_features(req.url)
-        reasons = get_url_explanation(url_model_instance.model, features_df)
+        features = url_model_instance.extract_features_dict(url)
+        reasons = get_url_explanation(url_model_instance.model, features)
     else:
         reasons = []
-        
-    result["explanations"] = reasons
+
+    result["explanations"] = tuple(reasons)
+    return tuple(result.items())
+
+def _reload_url_model_if_changed() -> int:
+    """
+    Pick up a retrained URL model and drop predictions made with the old one.
+    Returns the generation of the model now loaded.
+    """
+    global _url_model_generation
+    with _url_model_lock:
+        if url_model_instance.reload_if_changed():
+            _url_model_generation += 1
+            _cached_predict.cache_clear()
+        return _url_model_generation
+
+@app.post("/predict/url", response_model=URLPrediction, response_model_exclude_unset=True)
+def predict_url(req: URLRequest):
+    generation = _reload_url_model_if_changed()
+
+    result = dict(_cached_predict(req.url, generation))
+    if "explanations" in result:
+        result["explanations"] = list(result["explanations"])
     return result
 
-@app.post("/predict/email")
-async def predict_email(req: EmailRequest):
+@app.post("/predict/urls", response_model=URLBatchPrediction, response_model_exclude_unset=True)
+def predict_urls(req: URLBatchRequest):
+    """Score many URLs (e.g. a page's outlinks) with one model and explainer call."""
+    _reload_url_model_if_changed()
+
+    results = url_model_instance.predict_batch(req.urls)
+    for r in results:
+        if "error" not in r:
+            r["explanations"] = []
+
+    # Explainability, batched over the flagged rows only
+    flagged = [i for i, r in enumerate(results) if r["prediction"] == "phishing"]
+    if flagged and url_model_instance.model:
+        features_df = pd.DataFrame(
+            [url_model_instance.extract_features_dict(req.urls[i]) for i in flagged]
+        )
+        reasons = get_url_explanations(url_model_instance.model, features_df)
+        for i, row_reasons in zip(flagged, reasons):
+            results[i]["explanations"] = row_reasons
+
+    return {"results": results}
+
+@app.post("/predict/email", response_model=EmailPrediction)
+def predict_email(req: EmailRequest):
     # Check headers
     header_res = check_headers_for_anomalies(req.headers)
     
@@ -85,7 +201,7 @@ async def predict_email(req: EmailRequest):
     combined_risk = max(text_risk, header_risk)
     prediction = "phishing" if combined_risk > 0.5 else "safe"
     
-    explanations = header_res["anomalies_detected"]
+    explanations = [*header_res["anomalies_detected"]]
     
     # Add text explainability if risky
     if text_risk > 0.5 and email_model_instance.model and email_model_instance.vectorizer:
@@ -94,7 +210,7 @@ async def predict_email(req: EmailRequest):
             email_model_instance.model, 
             req.body_text
         )
-        explanations.extend(text_reasons)
+        explanations += text_reasons
         
     return {
         "url_or_subject": req.headers.get("Subject", "Email"),
@@ -105,14 +221,13 @@ async def predict_email(req: EmailRequest):
         "explanations": explanations
     }
 
-@app.post("/feedback")
-async def submit_feedback(req: FeedbackRequest):
-    from feedback_store import store_feedback, count_feedback, RETRAIN_THRESHOLD
+@app.post("/feedback", response_model=FeedbackResponse, response_model_exclude_unset=True)
+def submit_feedback(req: FeedbackRequest):
+    _reload_url_model_if_changed()
 
     if req.item_type == "url" and req.url:
         # Extract features from the URL so we can retrain on them
-        features_df = url_model_instance.extract_features(req.url)
-        features_dict = features_df.iloc[0].to_dict()
+        features_dict = url_model_instance.extract_features_dict(req.url)
 
         total = store_feedback(
             url=req.url,
@@ -121,10 +236,6 @@ async def submit_feedback(req: FeedbackRequest):
             prediction_was=req.prediction_was
         )
 
-        # If retrain was triggered, hot-reload the model
-        if total >= RETRAIN_THRESHOLD:
-            url_model_instance.load_model()
-
         return {
             "status": "success",
             "message": f"Feedback stored. {total}/{RETRAIN_THRESHOLD} corrections until next retrain.",
@@ -137,9 +248,8 @@ async def submit_feedback(req: FeedbackRequest):
             "message": "Feedback acknowledged (email feedback is noted but not used for retraining yet)."
         }
 
-@app.get("/feedback/status")
-async def feedback_status():
-    from feedback_store import count_feedback, RETRAIN_THRESHOLD
+@app.get("/feedback/status", response_model=FeedbackStatus)
+def feedback_status():
     total = count_feedback()
     return {
         "feedback_count": total,
@@ -147,17 +257,25 @@ async def feedback_status():
         "progress_percent": round((total / RETRAIN_THRESHOLD) * 100, 1)
     }
 
-@app.post("/scan/file")
+@app.post("/scan/file", response_model=FileScanResult)
 async def scan_uploaded_file(file: UploadFile = File(...)):
     """Scan an uploaded file (max 10MB) for malicious indicators."""
-    content = await file.read()
-
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File too large. Max size is {MAX_FILE_SIZE // (1024*1024)} MB."
-        )
+    # Read in chunks and stop as soon as the limit is exceeded, so an oversized
+    # upload is never held in memory in full.
+    size = 0
+    chunks = []
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        if size > MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large. Max size is {MAX_FILE_SIZE // (1024*1024)} MB."
+            )
+        chunks.append(chunk)
+    content = b"".join(chunks)
 
-    result = scan_file(file.filename, content)
+    # Scanning is CPU-bound: run it on the thread pool so the event loop keeps
+    # serving other requests (e.g. URL checks while browsing) meanwhile.
+    result = await run_in_threadpool(scan_file, file.filename, content)
     return result
 
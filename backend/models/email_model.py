@@ -12,8 +12,9 @@ class EmailModel:
 
     def load_models(self):
         if os.path.exists(self.vectorizer_path) and os.path.exists(self.model_path):
-            self.vectorizer = joblib.load(self.vectorizer_path)
-            self.model = joblib.load(self.model_path)
+            # mmap_mode shares the arrays' pages between worker processes
+            self.vectorizer = joblib.load(self.vectorizer_path, mmap_mode="r")
+            self.model = joblib.load(self.model_path, mmap_mode="r")
             print(f"Loaded Email models from {self.model_path}")
         else:
             print(f"Warning: Email models {self.model_path} not found. Please run train_email.py")
@@ -22,7 +23,7 @@ class EmailModel:
         if not self.model or not self.vectorizer:
             return {"risk_score": 0.5, "prediction": "unknown", "error": "Model not loaded"}
         
-        # We need generic features for SHAP. The TF-IDF itself provides feature explanations.
+        # We need generic features for SHAP. The token counts themselves provide feature explanations.
         # But for direct prediction:
         X = self.vectorizer.transform([text])
         prob = self.model.predict_proba(X)[0]
@@ -1,5 +1,8 @@
 import re
 
+# Address inside angle brackets, e.g. "Name <email@box.com>"
+_ANGLE_RE = re.compile(r'<([^>]+)>')
+
 def check_headers_for_anomalies(headers: dict):
     """
     Checks basic email header semantics for common phishing anomalies.
@@ -30,10 +33,10 @@ def check_headers_for_anomalies(headers: dict):
     reply_to = headers.get("Reply-To", "").lower()
     
     # Basic email extraction `<email@box.com>`
-    from_email = re.search(r'<([^>]+)>', from_header)
+    from_email = _ANGLE_RE.search(from_header)
     from_email = from_email.group(1) if from_email else from_header
     
-    reply_to_email = re.search(r'<([^>]+)>', reply_to)
+    reply_to_email = _ANGLE_RE.search(reply_to)
     reply_to_email = reply_to_email.group(1) if reply_to_email else reply_to
     
     if reply_to_email and from_email and from_email not in reply_to_email and reply_to_email not in from_email:
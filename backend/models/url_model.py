@@ -1,5 +1,5 @@
 """
-URL Feature Extraction and Prediction using the trained RandomForest model.
+URL Feature Extraction and Prediction using the trained gradient-boosted tree model.
 Feature names are aligned to the Kaggle "Phishing Website Detector" dataset:
   UsingIP, LongURL, ShortURL, Symbol@, Redirecting//, PrefixSuffix-,
   SubDomains, HTTPS, DomainRegLen, Favicon, NonStdPort, HTTPSDomainURL,
@@ -16,6 +16,11 @@ import urllib.parse
 import pandas as pd
 import numpy as np
 
+from explain.shap_explainer import reset_explainer_cache
+
+_IP_RE = re.compile(r"^\d{1,3}(?:\.\d{1,3}){3}$")
+_SHORTENER_RE = re.compile(r"bit\.ly|goo\.gl|tinyurl|t\.co|ow\.ly|is\.gd|buff\.ly|short\.to", re.I)
+
 
 class URLModel:
     def __init__(self, model_path="url_model.pkl", features_path="url_features.pkl"):
@@ -23,22 +28,77 @@ class URLModel:
         self.features_path = features_path
         self.model = None
         self.feature_names = None
+        self._feat_index = None
+        self._model_mtime = None
         self.load_model()
 
     def load_model(self):
+        reset_explainer_cache()
         if os.path.exists(self.model_path):
-            self.model = joblib.load(self.model_path)
+            self._model_mtime = os.stat(self.model_path).st_mtime_ns
+            # mmap_mode shares the arrays' pages between worker processes
+            self.model = joblib.load(self.model_path, mmap_mode="r")
             print(f"Loaded URL model from {self.model_path}")
         else:
             print(f"Warning: URL model {self.model_path} not found. Please train first.")
 
         if os.path.exists(self.features_path):
             self.feature_names = joblib.load(self.features_path)
+            self._feat_index = {name: i for i, name in enumerate(self.feature_names)}
             print(f"Loaded {len(self.feature_names)} feature names")
         else:
             print("Warning: url_features.pkl not found. Feature alignment may fail.")
 
+        # Score one dummy row now, so the first request after a (re)load doesn't
+        # pay for faulting in the mmap'd arrays and lazy setup
+        if self.model is not None:
+            try:
+                self.model.predict_proba(np.zeros((1, self.model.n_features_in_), dtype=np.float32))
+            except Exception as e:
+                print(f"Warning: URL model warm-up failed: {e}")
+
+    def reload_if_changed(self):
+        """
+        Reload the model if its file was replaced, e.g. by a background retrain.
+        Returns True if a reload happened.
+        """
+        try:
+            mtime = os.stat(self.model_path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._model_mtime:
+            return False
+        self.load_model()
+        return True
+
     def extract_features(self, url: str) -> pd.DataFrame:
+        """Single-row DataFrame version of extract_features_dict, for callers that need one."""
+        return pd.DataFrame([self.extract_features_dict(url)])
+
+    def extract_features_dict(self, url: str) -> dict:
+        """Features keyed in the order the model was trained on (missing columns are 0)."""
+        features = self._raw_features(url)
+        if self.feature_names:
+            features = {col: features.get(col, 0) for col in self.feature_names}
+        return features
+
+    def _extract_features_array(self, urls: list) -> np.ndarray:
+        """
+        Features as a (len(urls), n_features) float32 array in model column order,
+        filled by index. This is what predict_proba consumes, without any pandas objects.
+        """
+        if self._feat_index is None:
+            return np.array([list(self._raw_features(url).values()) for url in urls], dtype=np.float32)
+
+        X = np.zeros((len(urls), len(self._feat_index)), dtype=np.float32)
+        for row, url in zip(X, urls):
+            for name, value in self._raw_features(url).items():
+                i = self._feat_index.get(name)
+                if i is not None:
+                    row[i] = value
+        return X
+
+    def _raw_features(self, url: str) -> dict:
         """
         Extract the 30 features expected by the Kaggle dataset model from a raw URL string.
         Values follow the dataset convention: 1 = legitimate, -1 = phishing, 0 = suspicious.
@@ -47,18 +107,24 @@ class URLModel:
         domain = parsed.netloc or ""
         path = parsed.path or ""
         scheme = parsed.scheme or ""
+        dot_count = domain.count(".")
+        lc_domain = domain.lower()
+        lc_url = url.lower()
+        try:
+            port = parsed.port
+        except ValueError:
+            # Malformed or out-of-range port, e.g. "host:99999"
+            port = None
 
         features = {
             # 1. UsingIP – Is the host an IP address?
-            "UsingIP": -1 if re.match(r"^\d{1,3}(\.\d{1,3}){3}$", domain) else 1,
+            "UsingIP": -1 if _IP_RE.match(domain) else 1,
 
             # 2. LongURL – Length of the full URL
             "LongURL": 1 if len(url) < 54 else (0 if len(url) <= 75 else -1),
 
             # 3. ShortURL – Is a URL shortener used?
-            "ShortURL": -1 if re.search(
-                r"bit\.ly|goo\.gl|tinyurl|t\.co|ow\.ly|is\.gd|buff\.ly|short\.to", url, re.I
-            ) else 1,
+            "ShortURL": -1 if _SHORTENER_RE.search(url) else 1,
 
             # 4. Symbol@ – Does the URL contain '@'?
             "Symbol@": -1 if "@" in url else 1,
@@ -71,8 +137,8 @@ class URLModel:
 
             # 7. SubDomains – Number of dots in host
             "SubDomains": (
-                1 if domain.count(".") <= 1
-                else 0 if domain.count(".") == 2
+                1 if dot_count <= 1
+                else 0 if dot_count == 2
                 else -1
             ),
 
@@ -87,11 +153,11 @@ class URLModel:
 
             # 11. NonStdPort – Non-standard port in URL
             "NonStdPort": (
-                -1 if parsed.port and parsed.port not in (80, 443) else 1
+                -1 if port and port not in (80, 443) else 1
             ),
 
             # 12. HTTPSDomainURL – 'https' token inside the domain itself (spoofing trick)
-            "HTTPSDomainURL": -1 if "https" in domain.lower() else 1,
+            "HTTPSDomainURL": -1 if "https" in lc_domain else 1,
 
             # 13. RequestURL – Cannot determine without page content, default suspicious
             "RequestURL": -1,
@@ -106,7 +172,7 @@ class URLModel:
             "ServerFormHandler": -1,
 
             # 17. InfoEmail – Does the page submit data to an email?
-            "InfoEmail": -1 if "mailto:" in url.lower() else 1,
+            "InfoEmail": -1 if "mailto:" in lc_url else 1,
 
             # 18. AbnormalURL – Domain not in the URL body (simplified heuristic)
             "AbnormalURL": -1,
@@ -148,24 +214,30 @@ class URLModel:
             "StatsReport": 1,
         }
 
-        df = pd.DataFrame([features])
-
-        # Align columns to the order the model was trained on
-        if self.feature_names:
-            for col in self.feature_names:
-                if col not in df.columns:
-                    df[col] = 0
-            df = df[self.feature_names]
-
-        return df
+        return features
 
     def predict(self, url: str) -> dict:
         if not self.model:
             return {"risk_score": 0.5, "prediction": "unknown", "error": "Model not loaded"}
 
-        features_df = self.extract_features(url)
-        prob = self.model.predict_proba(features_df)[0]
+        prob = self.model.predict_proba(self._extract_features_array([url]))[0]
+        return self._result(url, prob)
+
+    def predict_batch(self, urls: list) -> list:
+        """
+        Like predict, for many URLs at once: one predict_proba call on an
+        (N, n_features) array instead of N single-row calls.
+        """
+        if not self.model:
+            return [self.predict(url) for url in urls]
+        if not urls:
+            return []
+
+        probs = self.model.predict_proba(self._extract_features_array(urls))
+        return [self._result(url, prob) for url, prob in zip(urls, probs)]
 
+    @staticmethod
+    def _result(url: str, prob) -> dict:
         # Class 0 = safe, Class 1 = phishing (as mapped during training)
         risk_score = round(float(prob[1]) if len(prob) > 1 else float(prob[0]), 3)
         prediction = "phishing" if risk_score > 0.5 else "safe"
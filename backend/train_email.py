@@ -1,5 +1,5 @@
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import HashingVectorizer
 from sklearn.model_selection import train_test_split
 from sklearn.naive_bayes import MultinomialNB
 import joblib
@@ -9,7 +9,7 @@ MODEL_PATH = "email_model.pkl"
 
 def train_dummy_model():
     """
-    Trains a basic TF-IDF + Naive Bayes/Logistic Regression model on a simple dataset.
+    Trains a basic hashed bag-of-words + Naive Bayes model on a simple dataset.
     In a real scenario, we would use enron-spam or similar.
     """
     print("Training basic email text classifier...")
@@ -30,8 +30,13 @@ def train_dummy_model():
     ]
     df = pd.DataFrame(data)
     
-    vectorizer = TfidfVectorizer(stop_words='english', max_features=1000)
-    X = vectorizer.fit_transform(df['text'])
+    # Hashing needs no fitted vocabulary, so the vectorizer stays tiny however
+    # large the training corpus gets (and supports out-of-core training).
+    # alternate_sign=False and no norm keep the counts MultinomialNB expects.
+    vectorizer = HashingVectorizer(
+        n_features=2**18, alternate_sign=False, stop_words='english', norm=None
+    )
+    X = vectorizer.transform(df['text'])
     y = df['label']
     
     clf = MultinomialNB()
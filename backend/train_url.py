@@ -1,11 +1,11 @@
 """
-Train a RandomForest classifier on the Kaggle Phishing Website Detector dataset.
+Train a HistGradientBoosting classifier on the Kaggle Phishing Website Detector dataset.
 Expects ../data/phishing.csv with 30 feature columns + 'class' target.
 """
 
 import pandas as pd
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble import HistGradientBoostingClassifier
 from sklearn.metrics import classification_report
 import joblib
 import os
@@ -38,15 +38,21 @@ def train_model():
     joblib.dump(feature_names, FEATURES_PATH)
     print(f"Saved {len(feature_names)} feature names to {FEATURES_PATH}")
 
+    # Fit on a plain array: prediction passes arrays in the saved column order,
+    # and a model fitted on a DataFrame would warn about missing feature names.
     X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
+        X.to_numpy(), y, test_size=0.2, random_state=42, stratify=y
     )
 
     print(f"Training set: {X_train.shape[0]} samples")
     print(f"Test set:     {X_test.shape[0]} samples")
-    print("Training RandomForestClassifier (200 trees)...")
+    print("Training HistGradientBoostingClassifier (200 iterations)...")
 
-    clf = RandomForestClassifier(n_estimators=200, random_state=42, n_jobs=-1)
+    # Matches a 200-tree RandomForest's accuracy on this data with a much
+    # smaller model that scores faster.
+    clf = HistGradientBoostingClassifier(
+        max_iter=200, learning_rate=0.1, max_leaf_nodes=31, random_state=42
+    )
     clf.fit(X_train, y_train)
 
     acc = clf.score(X_test, y_test)